@@ -48,7 +48,7 @@ __version__ = '0.4.0'
 
 from pymol import cmd, plugins
 
-from . import gui, io, misc
+from . import io, misc
 
 
 ##  PYMOL FUNCTIONS  ##################################################
@@ -60,6 +60,7 @@ cmd.extend("load_xyz", io.load_xyz)
 cmd.extend("export_docked_data", io.export_docked_data)
 cmd.extend("align_multi", misc.align_multi)
 # Override built-in functions -----------------------------------------
+# both are needed: the attribute for API callers, 'extend' for the command line
 cmd.load = io.load_ext
 cmd.extend("load", cmd.load)
 cmd.set_name = misc.set_name_catcher
@@ -68,4 +69,8 @@ cmd.extend("set_name", cmd.set_name)
 ##  GUI  ##############################################################
 def __init_plugin__(app=None):
     """Add an entry to the PyMOL 'Plugin' menu"""
-    plugins.addmenuitemqt("PyViewDock", gui.run_gui)
+    def run_gui():
+        # Qt and the dialog are only loaded the first time it is opened
+        from . import gui
+        gui.run_gui()
+    plugins.addmenuitemqt("PyViewDock", run_gui)
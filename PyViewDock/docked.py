@@ -13,10 +13,12 @@
 
 """
 
+import csv
 import os
 import re
-from copy import deepcopy
+from bisect import bisect_left
 from glob import glob
+from itertools import count, groupby, islice
 from tempfile import NamedTemporaryFile
 
 from pymol import cmd, importing, CmdException
@@ -25,6 +27,31 @@ from . import __version__
 from . import misc
 
 
+# REMARK line of Dock 4 format, with the value captured in a group named by its type
+_REMARK_RE = re.compile(r'^REMARK\b[ \t]+(?P<key>[_\w-]+)[ \t]*:[ \t]*'
+                        r'(?:(?P<int>\d+)'
+                        r'|(?P<float>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|(?i:[-+]?(?:nan|inf|infinity)))'
+                        r'|(?P<str>.+))$', re.MULTILINE)
+_REMARK_TYPES = {'int': int, 'float': float, 'str': str}
+# remarks written by AutoDock Vina
+_VINA_HEADERS = ['MODEL', 'affinity', 'RMSD l.b.', 'RMSD u.b.', 'ITER + INTRA', 'INTER', 'INTRA', 'CONF_INDEPENDENT', 'UNBOUND', 'Flexibility Score']
+# 'key: value' remarks of AutoDock Vina, after the 'REMARK' record name
+_VINA_REMARK_RE = re.compile(r'^(VINA RESULT|' + '|'.join(map(re.escape, _VINA_HEADERS)) + r')[ \t]*:[ \t]*(.*)$')
+# number of conformation at the end of pyDock's PDB filenames
+_CONF_RE = re.compile(r'_(\d+)\.pdb$')
+
+# 'Docked' object attached to the current session
+_docked = None
+# source of unique revision numbers, shared by all 'Docked' objects
+_revisions = count()
+
+
+def _pdb_record(line:str) -> str:
+    '''Return the record name of a PDB line (as 'ATOM' for 'HETATM')'''
+    record = line.split(None, 1)[0].upper()
+    return 'ATOM' if record == 'HETATM' else record
+
+
 def set_docked(docked:'Docked') -> None:
     '''
     DESCRIPTION
@@ -35,8 +62,10 @@ def set_docked(docked:'Docked') -> None:
 
         docked = Docked: 'Docked' object
     '''
+    global _docked
     from pymol import session
     session.PyViewDock = docked.data
+    _docked = docked
 
 def get_docked() -> 'Docked':
     '''
@@ -50,7 +79,12 @@ def get_docked() -> 'Docked':
         Docked: 'Docked' object
     '''
     from pymol import session
-    if not 'PyViewDock' in vars(session):
+    # reuse the live object while it is still the one attached to the session
+    session_PyViewDock = vars(session).get('PyViewDock')
+    if _docked is not None and isinstance(session_PyViewDock, dict) \
+            and session_PyViewDock.get('entries') is _docked.entries:
+        return _docked
+    if session_PyViewDock is None:
         docked = Docked()
     else:
         if isinstance(session.PyViewDock, dict):
@@ -61,6 +95,7 @@ def get_docked() -> 'Docked':
                                   'entries': session.PyViewDock.entries,
                                   'headers': session.PyViewDock.headers}
         docked = Docked(session_PyViewDock)
+    set_docked(docked)
     return docked
 
 class Docked():
@@ -87,8 +122,10 @@ class Docked():
 
         n_entries = int
         entries_unified = list
-        objects = set
-        remarks = set
+        objects = frozenset
+        objects_index = dict
+        remarks = frozenset
+        revision = int
         data = dict
     '''
 
@@ -96,7 +133,7 @@ class Docked():
     internal_empty = {'object':'', 'state': 0}
 
     headers_default = {
-        'AutoDock-Vina': ['MODEL', 'affinity', 'RMSD l.b.', 'RMSD u.b.', 'ITER + INTRA', 'INTER', 'INTRA', 'CONF_INDEPENDENT', 'UNBOUND', 'Flexibility Score'],
+        'AutoDock-Vina': _VINA_HEADERS,
         'Swiss-Dock - EADock DSS': ['Cluster', 'ClusterRank', 'deltaG'],
         'Swiss-Dock - Attracting Cavities': ['CLUSTER_NUM', 'CLUSTER_MEMBER', 'MEMBER_ENERGY', 'MEMBER_SCORE'],
         'Swiss-Dock - AutoDock-Vina': ['MODEL', 'affinity', 'RMSD l.b.', 'RMSD u.b.', 'INTER + INTRA', 'INTER', 'INTRA', 'UNBOUND', 'Flexibility Score'],
@@ -111,7 +148,7 @@ class Docked():
         if session_PyViewDock:
             self.entries = session_PyViewDock['entries']
             self.headers = session_PyViewDock['headers']
-        set_docked(self)
+        self._invalidate()
 
     @property
     def n_entries(self) -> int:
@@ -120,19 +157,31 @@ class Docked():
     @property
     def entries_unified(self) -> list:
         '''Return entries as a list of a unified dictionary, joining 'remarks' and 'internal'''
-        return [{**entry['internal'], **entry['remarks']} for entry in self.entries]
+        if self._entries_unified is None:
+            self._entries_unified = [{**entry['internal'], **entry['remarks']} for entry in self.entries]
+        return self._entries_unified
 
     @property
-    def objects(self) -> set:
-        return {i['internal']['object'] for i in self.entries}
+    def objects(self) -> frozenset:
+        if self._objects is None:
+            self._objects = frozenset(self.objects_index)
+        return self._objects
 
     @property
-    def remarks(self) -> set:
-        if not self.entries:
-            return set()
-        else:
+    def objects_index(self) -> dict:
+        '''Return the index of entries of every object, as {object: [ndx, ...]}'''
+        if self._objects_index is None:
+            self._objects_index = dict()
+            for n, entry in enumerate(self.entries):
+                self._objects_index.setdefault(entry['internal']['object'], []).append(n)
+        return self._objects_index
+
+    @property
+    def remarks(self) -> frozenset:
+        if self._remarks is None:
             # get all readed REMARKs
-            return {j for i in self.entries for j in i['remarks'].keys()}
+            self._remarks = frozenset(j for i in self.entries for j in i['remarks'].keys())
+        return self._remarks
 
     @property
     def data(self) -> dict:
@@ -143,19 +192,71 @@ class Docked():
             'headers': self.headers
             }
 
+    def _invalidate(self) -> None:
+        '''Discard the data cached from the entries, to be called after any change on them'''
+        self._entries_unified = None
+        self._objects = None
+        self._objects_index = None
+        self._remarks = None
+        self._revision = next(_revisions)
+
+    @property
+    def revision(self) -> int:
+        '''Return a number that changes every time the entries are modified'''
+        return self._revision
+
     def clear(self) -> None:
         '''Remove all the objects related to the class and clear it's entries'''
         for obj in self.objects:
             cmd.delete(obj)
         self.__init__()
+        set_docked(self)
+
+    def equalize_remarks(self, since_ndx=0) -> None:
+        '''
+        DESCRIPTION
+
+            Add to all entries the same remarks, with None value if not previously set
+
+        ARGUMENTS
 
-    def equalize_remarks(self) -> None:
-        '''Add to all entries the same remarks, with None value if not previously set'''
+            since_ndx = int: index of the first new entry, the previous ones are
+                             expected to be already equalized {default: 0}
+        '''
+        # entries removed here may include new ones (e.g. without structure), so counting
+        # back from the end can only re-include already equalized entries, which is harmless
+        n_new = self.n_entries - since_ndx
         self.remove_without_objects()
+        since_ndx = max(0, self.n_entries - n_new)
         all_remarks = self.remarks
-        for entry in self.entries:
-            for remark in all_remarks:
-                entry['remarks'].setdefault(remark, None)
+        if since_ndx > 0:
+            # equalized entries can only miss the remarks brought by the new ones
+            missing_remarks = all_remarks - self.entries[0]['remarks'].keys()
+            if missing_remarks:
+                for entry in islice(self.entries, since_ndx):
+                    entry['remarks'].update(dict.fromkeys(missing_remarks))
+        for entry in islice(self.entries, since_ndx, None):
+            missing_remarks = all_remarks - entry['remarks'].keys()
+            if missing_remarks:
+                entry['remarks'].update(dict.fromkeys(missing_remarks))
+        self._invalidate()
+
+    def _iter_matching(self, match_all=True, **remarks_and_values):
+        '''Return an iterator over the index of entries that match all/any remarks'''
+        # check input fields
+        if remarks_and_values.keys() - self.remarks - {'object', 'state'}:
+            raise ValueError("Not valid remark provided")
+        # find any/all entries that match, looking up each field in its own dictionary
+        fields = [('internal' if key in ('object', 'state') else 'remarks', key, value)
+                  for key, value in remarks_and_values.items()]
+        if len(fields) == 1:
+            section, key, value = fields[0]
+            if key == 'object':
+                return iter(self.objects_index.get(value, ()))
+            return (n for n, entry in enumerate(self.entries) if entry[section][key] == value)
+        matcher = all if match_all else any
+        return (n for n, entry in enumerate(self.entries)
+                if matcher(entry[section][key] == value for section, key, value in fields))
 
     def findall(self, match_all=True, **remarks_and_values) -> list:
         '''
@@ -175,13 +276,7 @@ class Docked():
 
             list: list of index of entries that match
         '''
-        # check input fields
-        if remarks_and_values.keys() - self.remarks - {'object', 'state'}:
-            raise ValueError("Not valid remark provided")
-        # find any/all entries that match
-        matcher = all if match_all else any
-        return [n for n, entry in enumerate(self.entries_unified)
-                if matcher(entry[key] == value for key, value in remarks_and_values.items())]
+        return list(self._iter_matching(match_all=match_all, **remarks_and_values))
 
     def find(self, match_all=True, **remarks_and_values) -> int:
         '''
@@ -201,11 +296,7 @@ class Docked():
 
             int: index of entry that match, None if not found
         '''
-        matching_index = self.findall(match_all=match_all, **remarks_and_values)
-        if matching_index:
-            return matching_index[0]
-        else:
-            return None
+        return next(self._iter_matching(match_all=match_all, **remarks_and_values), None)
 
     def remove_ndx(self, ndx, update=True) -> None:
         '''
@@ -219,19 +310,55 @@ class Docked():
 
             update = bool: update entries by decrement 'state' of same 'object' {default: True}
         '''
-        object = self.entries[ndx]['internal']['object']
-        state = self.entries[ndx]['internal']['state']
-        del self.entries[ndx]
-        if object in cmd.get_names('objects'):
-            tmp_object = misc.non_repeated_object("tmp")
-            cmd.create(tmp_object, f"object {object}", zoom=0, quiet=1)
+        self.remove_many([ndx], update)
+
+    def remove_many(self, indices, update=True) -> None:
+        '''
+        DESCRIPTION
+
+            Remove stored entries and states based on indices,
+            rebuilding each affected object only once
+
+        ARGUMENTS
+
+            indices = list of int: indices of entries to remove
+
+            update = bool: update entries by decrement 'state' of same 'object' {default: True}
+        '''
+        indices = set(indices)
+        if not indices:
+            return
+        removed_states = dict()
+        for n in indices:
+            internal = self.entries[n]['internal']
+            removed_states.setdefault(internal['object'], []).append(internal['state'])
+        # modify in place, the list is shared with the session
+        self.entries[:] = [entry for n, entry in enumerate(self.entries) if n not in indices]
+        self._invalidate()
+        for object, states in removed_states.items():
+            self._rebuild_object(object, states, update)
+
+    def _rebuild_object(self, object, removed_states, update=True) -> None:
+        '''Rebuild a PyMOL object with the states of its remaining entries, after removing some'''
+        if object not in cmd.get_names('objects'):
+            return
+        same_object = [self.entries[n] for n in self.findall(object=object)]
+        if not same_object:
             cmd.delete(object)
-            for entry in [self.entries[n] for n in self.findall(object=object)]:
-                entry_state = entry['internal']['state']
-                cmd.create(object, f"object {tmp_object}", source_state=entry_state, target_state=-1, zoom=0, quiet=1, extract=None)
-                if update:
-                    entry['internal']['state'] -= int(entry_state > state)
-            cmd.delete(tmp_object)
+            return
+        tmp_object = misc.non_repeated_object("tmp")
+        cmd.create(tmp_object, f"object {object}", zoom=0, quiet=1)
+        cmd.delete(object)
+        # append the kept states in order, so they are renumbered contiguously
+        for entry in sorted(same_object, key=lambda entry: entry['internal']['state']):
+            cmd.create(object, f"object {tmp_object}", source_state=entry['internal']['state'], target_state=-1, zoom=0, quiet=1, extract=None)
+        cmd.delete(tmp_object)
+        if update:
+            # decrement by the number of removed states below each one
+            removed_states = sorted(removed_states)
+            for entry in same_object:
+                entry['internal']['state'] -= bisect_left(removed_states, entry['internal']['state'])
+        self._invalidate()
 
     def remove(self, match_all=True, **remarks_and_values) -> None:
         '''
@@ -247,14 +374,12 @@ class Docked():
                 key = str: remark to match
                 value = float / int / str: value to match
         '''
-        matching_index = self.findall(match_all=match_all, **remarks_and_values)
-        for n in sorted(matching_index, reverse=True):
-            self.remove_ndx(n)
+        self.remove_many(self.findall(match_all=match_all, **remarks_and_values))
 
     def remove_without_objects(self) -> None:
         '''Delete the entries without object in PyMOL'''
-        for object_to_remove in self.objects - set(cmd.get_names('objects')):
-            self.remove(object=object_to_remove)
+        objects_alive = set(cmd.get_names('objects'))
+        self.remove_many([n for n, entry in enumerate(self.entries) if entry['internal']['object'] not in objects_alive])
 
     def modify_entries(self, remark, old_value, new_value) -> None:
         '''
@@ -274,6 +399,7 @@ class Docked():
         for entry in self.entries:
             if entry[section][remark] == old_value:
                 entry[section][remark] = new_value
+        self._invalidate()
 
     def copy_to_object(self, ndx, object, keep_docked=False, extract=False) -> None:
         '''
@@ -293,9 +419,9 @@ class Docked():
         '''
         entry = self.entries[ndx]
         if keep_docked:
-            self.entries.append(deepcopy(entry))
-            self.entries[-1]['internal']['object'] = object
-            self.entries[-1]['internal']['state'] = 1
+            self.entries.append({'internal': {**entry['internal'], 'object': object, 'state': 1},
+                                 'remarks': dict(entry['remarks'])})
+            self._invalidate()
         cmd.create(object,
                    f"object {entry['internal']['object']}",
                    source_state=entry['internal']['state'],
@@ -321,8 +447,8 @@ class Docked():
 
         #TODO: implement 'vina_split'
 
-        with open(file, 'r') as f:
-            pdbqt = [line.strip() for line in f.readlines() if line.strip()]
+        with misc.open_file(file) as f:
+            pdbqt = [line for line in (line.strip() for line in f) if line]
 
         # split into poses (starts with MODEL) and read remarks
         remarks = []
@@ -338,37 +464,36 @@ class Docked():
                 remark = dict()
                 remark['MODEL'] = int(line.split()[1])
             elif line.startswith('REMARK'):
-                line = line.split('REMARK')[1].strip()
-                for autodock_remark in self.headers_default['AutoDock-Vina']:
-                    if line.startswith('VINA RESULT:'):
-                        values = line.split(':')[1].split()
-                        remark['affinity'] = float(values[0])
-                        remark['RMSD l.b.'] = float(values[1])
-                        remark['RMSD u.b.'] = float(values[2])
-                    elif line.startswith(autodock_remark):
-                        value = line.split(':')[1].strip()
-                        if value.isdigit():
-                            value = float(value)
-                        remark[autodock_remark] = value
+                line = line[6:].strip()
+                match = _VINA_REMARK_RE.match(line)
+                if match and match[1] == 'VINA RESULT':
+                    values = match[2].split()
+                    remark['affinity'] = float(values[0])
+                    remark['RMSD l.b.'] = float(values[1])
+                    remark['RMSD u.b.'] = float(values[2])
+                elif match:
+                    value = match[2].strip()
+                    if value.isdigit():
+                        value = float(value)
+                    remark[match[1]] = value
             pose.append(line)
         poses.append(pose)
         remarks.append(remark)
 
-        # load structures
-        entries = []
-        for n, (pose, remark) in enumerate(zip(poses, remarks)):
-            try:
-                with NamedTemporaryFile('w', delete=False) as f:
-                    f.write('\n'.join(pose))
-                    f.flush()
-                    importing.load(f.name, object, format='pdbqt')
-            finally:
-                os.unlink(f.name)
-            cmd.show_as('sticks', object)
-            entries.append({'internal': {'object': object, 'state': n + 1}, 'remarks': remark})
+        # load structures, all poses at once (one state per MODEL)
+        try:
+            with NamedTemporaryFile('w', delete=False) as f:
+                f.write('\n'.join(line for pose in poses for line in pose))
+            importing.load(f.name, object, format='pdbqt')
+        finally:
+            os.unlink(f.name)
+        cmd.show_as('sticks', object)
+        entries = [{'internal': {'object': object, 'state': n + 1}, 'remarks': remark}
+                   for n, remark in enumerate(remarks)]
 
         self.entries.extend(entries)
-        self.equalize_remarks()
+        self._invalidate()
+        self.equalize_remarks(since_ndx=self.n_entries - len(entries))
 
     def load_dock4(self, cluster, object, mode) -> None:
         '''
@@ -378,7 +503,7 @@ class Docked():
 
         ARGUMENTS
 
-            cluster = list of str: list of string lines from cluster of structures in PDB format
+            cluster = iterable of str: lines from cluster of structures in PDB format (e.g. list or opened file)
 
             object = str: name to be include the new object
 
@@ -388,49 +513,30 @@ class Docked():
                 2 - all molecules to multiple objects according to clusters
         '''
 
-        cluster = [line.strip() for line in cluster if line.strip()]
+        cluster = (line for line in map(str.strip, cluster) if line)
 
-        # read all structures remarks/coordinates
-        i = 0
+        # read all structures remarks/coordinates, by runs of the same record
         pdb = []
         entries = []
-        remark_re = re.compile(r'^REMARK\b\s+([_\w-]+)\s*:\s*(.+)$')
-        while i < len(cluster):
-
-            pdb_keyword = cluster[i].split()[0].upper()
+        remarks = dict()
+        for record, run in groupby(cluster, key=_pdb_record):
 
             # process docking information in REMARKs
-            if pdb_keyword == 'REMARK':
+            if record == 'REMARK':
                 remarks = dict()
-                # loop over REMARKs until no compliant found
-                while remark_re.match(cluster[i]):
-                    match = remark_re.match(cluster[i])
-                    key = str(match.group(1))
-                    # convert to int/float/str
-                    value = match.group(2)
-                    if value.isdigit():
-                        value = int(value)
-                    else:
-                        try:
-                            value = float(value)
-                        except ValueError:
-                            value = str(value)
-                    remarks[key] = value
-                    i += 1
+                remarks_block = "\n".join(run)
+                for match in _REMARK_RE.finditer(remarks_block):
+                    # convert to int/float/str according to the matched group
+                    value_type = match.lastgroup
+                    remarks[match.group('key')] = _REMARK_TYPES[value_type](match.group(value_type))
 
             # take whole molecule PDB coordinate lines
-            elif pdb_keyword in ('ATOM', 'HETATM'):
-                i_0 = i
-                while cluster[i].split()[0].upper() in ('ATOM', 'HETATM'):
-                    i += 1
-                pdb_molecule = "\n".join(cluster[i_0:i]) + '\nENDMDL\n'
+            elif record == 'ATOM':
+                pdb_molecule = "\n".join(run) + '\nENDMDL\n'
 
                 # append to main attribute at the end of molecule
                 pdb.append(pdb_molecule)
-                entries.append({'remarks':remarks, 'internal':deepcopy(self.internal_empty)})
-
-            else:
-                i += 1
+                entries.append({'remarks':remarks, 'internal':self.internal_empty.copy()})
 
         # set internals
         for n, i in enumerate(entries):
@@ -451,7 +557,7 @@ class Docked():
                     n_state += 1
                     entries_tmp[-1]['internal']['state'] = n_state
 
-            entries, pdb = deepcopy(entries_tmp), deepcopy(pdb_tmp)
+            entries, pdb = entries_tmp, pdb_tmp
             cmd.read_pdbstr("".join(pdb), object)
 
         # load all in different objects by Cluster
@@ -464,16 +570,23 @@ class Docked():
                 object_new = object + '-' + str(e['remarks']['Cluster'])
                 pdb_tmp.setdefault(object_new, []).append(p)
                 e['internal']['object'] = object_new
-                e['internal']['state'] = len(pdb_tmp[object_new]) + 1
-            for object_new, p in pdb_tmp.items():
-                cmd.read_pdbstr("".join(p), object_new)
+                e['internal']['state'] = len(pdb_tmp[object_new])
+            # redraw only once all the clusters are loaded
+            suspend_updates = cmd.get('suspend_updates')
+            cmd.set('suspend_updates', 1)
+            try:
+                for object_new, p in pdb_tmp.items():
+                    cmd.read_pdbstr("".join(p), object_new)
+            finally:
+                cmd.set('suspend_updates', suspend_updates)
 
         # load all in one object
         else:
             cmd.read_pdbstr("".join(pdb), object)
 
         self.entries.extend(entries)
-        self.equalize_remarks()
+        self._invalidate()
+        self.equalize_remarks(since_ndx=self.n_entries - len(entries))
 
     def load_pydock(self, filename, object, max_n) -> None:
         '''
@@ -499,41 +612,55 @@ class Docked():
         # get list of matching pdb files
         pdb_files = glob(os.path.join(directory, "*.pdb"))
 
-        # find receptor and ligand files
-        try:
-            receptor_file = [i for i in pdb_files if "_rec.pdb" in i][0]
-            ligand_file = [i for i in pdb_files if "_lig.pdb" in i][0]
-        except:
+        # find receptor and ligand files, and index conformer files by their number
+        receptor_file, ligand_file = None, None
+        conf_files = dict()
+        for pdb_file in pdb_files:
+            if pdb_file.endswith("_rec.pdb"):
+                receptor_file = receptor_file or pdb_file
+            elif pdb_file.endswith("_lig.pdb"):
+                ligand_file = ligand_file or pdb_file
+            else:
+                match = _CONF_RE.search(pdb_file)
+                if match:
+                    conf_files.setdefault(int(match.group(1)), pdb_file)
+        if receptor_file is None or ligand_file is None:
             raise CmdException("Failed loading pyDock file. Missing '_rec.pdb' or '_lig.pdb'.", "PyViewDock")
 
         # read energy file
         entries = []
-        with open(filename, "rt") as f:
-            energy_file = [line.strip() for line in f.readlines() if line.strip() and not line.startswith("----")]
-            header = energy_file.pop(0).split()
+        with misc.open_file(filename) as f:
+            energy_file = (line for line in map(str.strip, f) if line and not line.startswith("----"))
+            header = next(energy_file, "").split()
+            if not header:
+                raise CmdException("Failed loading pyDock file. Empty energy file.", "PyViewDock")
+            converters = [int if h in ('Conf', 'RANK') else float for h in header]
             for line in energy_file:
-                remarks = { h:(int(v) if h in {'Conf', 'RANK'} else float(v)) for h,v in zip(header, line.split())}
-                entries.append({'remarks':deepcopy(remarks), 'internal':deepcopy(self.internal_empty)})
+                remarks = { h:convert(v) for h,convert,v in zip(header, converters, line.split())}
+                entries.append({'remarks':remarks, 'internal':self.internal_empty.copy()})
 
         # load receptor
         importing.load(receptor_file, rec_obj)
 
-        # load ligands
+        # load ligands, gathered as models of a single PDB
         loaded = []
+        lig_pdb = []
         not_found_warning = False
         for n, entry in enumerate(entries):
             if n+1 > max_n: break
-            conf_num = entry['remarks']['Conf']
-            try:
-                conf_file = [i for i in pdb_files if f"_{conf_num}.pdb" in i][0]
-            except IndexError:
+            conf_file = conf_files.get(entry['remarks']['Conf'])
+            if conf_file is None:
                 not_found_warning = True
                 continue
-            else:
-                loaded.append(n)
-                entry['internal']['object'] = lig_obj
-                entry['internal']['state'] = len(loaded)
-                importing.load(conf_file, lig_obj, 0)
+            loaded.append(n)
+            entry['internal']['object'] = lig_obj
+            entry['internal']['state'] = len(loaded)
+            with open(conf_file, 'rt') as f:
+                conf_pdb = [line.rstrip('\n') for line in f
+                            if line[:6].strip() not in ('MODEL', 'ENDMDL', 'END')]
+            lig_pdb.append(f"MODEL {len(loaded)}\n" + "\n".join(conf_pdb) + "\nENDMDL\n")
+        if lig_pdb:
+            cmd.read_pdbstr("".join(lig_pdb), lig_obj)
 
         if not_found_warning:
             print(" PyViewDock: WARNING! Some ligands defined on the energy file could not been found and loaded.")
@@ -546,7 +673,8 @@ class Docked():
         cmd.remove(f"{lig_obj} in {rec_obj}")
 
         self.entries.extend(entries)
-        self.equalize_remarks()
+        self._invalidate()
+        self.equalize_remarks(since_ndx=self.n_entries - len(entries))
 
     def load_xyz(self, filename, object) -> None:
         '''
@@ -562,32 +690,36 @@ class Docked():
             object = str: name to be include the new object
         '''
 
-        # read comments from xyz file
-        with open(filename, 'rt') as f:
-            xyz_file = f.readlines()
-        nline = 0
+        # read comments from xyz file, jumping from one frame header to the next
         comments = []
-        while nline < len(xyz_file):
-            natoms = int(xyz_file[nline])
-            comments.append(xyz_file[nline+1].strip())
-            nline += natoms+2
-
-        # process comments
+        with misc.open_file(filename, 'rb') as f:
+            for header in iter(f.readline, b''):
+                if not header.strip():
+                    break
+                natoms = int(header)
+                comments.append(f.readline().strip().decode('utf-8'))
+                # skip the coordinates
+                for _ in islice(f, natoms):
+                    pass
+
+        # process comments, as numbers if all of them are
         # TODO: broader processing and pattern recognition
-        if all(isinstance(i, float) for i in comments):
-            comments = [float(i) for i in comments]
+        try:
+            comments = [float(comm) for comm in comments]
+        except ValueError:
+            pass
 
         # add entries to data class
         for n, comm in enumerate(comments):
             remarks = {'structure': n+1, 'value': comm}
             self.entries.append({'internal': {'object': object, 'state': n+1},
                                  'remarks': remarks})
+        self._invalidate()
 
         # load structures into PyMOL
         importing.load(filename, object=object, format='xyz', quiet=1)
-        importing.load_pdbstr
 
-        self.equalize_remarks()
+        self.equalize_remarks(since_ndx=self.n_entries - len(comments))
 
     def export_data(self, filename, format=None) -> None:
         '''
@@ -609,24 +741,24 @@ class Docked():
 
         # guess format
         if not format:
-            format = os.path.basename(filename).rpartition('.')[-1].lower()
+            format = os.path.splitext(filename)[1][1:].lower()
         # check supported format
         format = format.lower()
         if not format in {'csv', 'txt'}:
             raise ValueError("Unknown file format")
 
-        # build data
         remarks = list(self.entries[0]['remarks'].keys())
-        joiner = ";" if format=='csv' else "  "
-        data = [joiner.join(remarks)+"\n"]
-        for entry in self.entries:
-            data_entry = [str(entry['remarks'][r]) for r in remarks]
-            data.append(joiner.join(data_entry)+"\n")
-
-        # write data file
-        with open(filename, 'w', encoding='utf-8') as f:
-            if format=='txt': f.write('#  '+data.pop(0))
-            f.writelines(data)
+        rows = ([str(entry['remarks'][remark]) for remark in remarks] for entry in self.entries)
+
+        # write data file, all rows in one call
+        with open(filename, 'w', encoding='utf-8', newline='') as f:
+            if format=='csv':
+                writer = csv.writer(f, delimiter=';', lineterminator='\n')
+                writer.writerow(remarks)
+                writer.writerows(rows)
+            else:
+                f.write('#  '+"  ".join(remarks)+"\n")
+                f.writelines("  ".join(row)+"\n" for row in rows)
 
         print(f" PyViewDock: Data exported to \"{filename}\" as \"{format}\".")
 
@@ -644,4 +776,6 @@ class Docked():
         '''
         if remark not in self.remarks:
             raise ValueError("Unkown 'remark' to sort by")
-        self.entries = sorted(self.entries, key=lambda k: k['remarks'][remark], reverse=reverse)
+        # sort in place, keeping entries without value at the end
+        self.entries.sort(key=lambda k: ((k['remarks'][remark] is None) != reverse, k['remarks'][remark]), reverse=reverse)
+        self._invalidate()
@@ -2,6 +2,10 @@
   Graphical User Interface
   ========================
 
+  Classes
+  -------
+    DockedTableModel
+
   Functions
   ---------
     run_gui
@@ -10,6 +14,7 @@
 
 import os
 import webbrowser
+from itertools import chain
 
 from pymol import cmd
 from pymol.Qt import QtCore, QtGui, QtWidgets
@@ -19,6 +24,131 @@ from . import __version__, io, misc
 from .docked import get_docked
 
 
+class DockedTableModel(QtCore.QAbstractTableModel):
+    '''
+    DESCRIPTION
+
+        Table model over a subset of docked entries, with a column per header
+        The view only requests the data of the visible cells
+
+    ATTRIBUTES
+
+        entries = list: unified entries, one per row
+        headers = list: remarks, one per column
+        sort_by = tuple: header and order of the last sorting, None if unsorted
+    '''
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.entries = []
+        self.headers = []
+        self.sort_by = None
+
+    def set_entries(self, entries, headers) -> None:
+        '''Replace the rows and columns, keeping the last sorting if still possible'''
+        self.beginResetModel()
+        self.entries = entries
+        self.headers = headers
+        if self.sort_by and self.sort_by[0] in headers:
+            self._sort_entries()
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.entries)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            return self.entries[index.row()][self.headers[index.column()]]
+        elif role == QtCore.Qt.TextAlignmentRole:
+            return QtCore.Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder) -> None:
+        '''Sort rows by a column, with empty values at the end'''
+        if not 0 <= column < len(self.headers):
+            return
+        self.sort_by = (self.headers[column], order)
+        self.layoutAboutToBeChanged.emit()
+        # keep the selection on the same entries
+        persistent = self.persistentIndexList()
+        persistent_entries = [self.entries[index.row()] for index in persistent]
+        self._sort_entries()
+        new_rows = {id(entry): row for row, entry in enumerate(self.entries)}
+        self.changePersistentIndexList(persistent, [self.index(new_rows[id(entry)], index.column())
+                                                    for entry, index in zip(persistent_entries, persistent)])
+        self.layoutChanged.emit()
+
+    def _sort_entries(self) -> None:
+        header, order = self.sort_by
+        reverse = order == QtCore.Qt.DescendingOrder
+        # numbers and strings apart, to not compare them
+        self.entries.sort(key=lambda entry: ((entry[header] is None) != reverse, isinstance(entry[header], str), entry[header]),
+                          reverse=reverse)
+
+    def entry(self, row) -> dict:
+        '''Return the unified entry of a row'''
+        return self.entries[row]
+
+
+class _ShowEventFilter(QtCore.QObject):
+    '''Call a function every time the watched window is shown or restored'''
+
+    def __init__(self, callback, parent=None) -> None:
+        super().__init__(parent)
+        self.callback = callback
+
+    def eventFilter(self, obj, event) -> bool:
+        if event.type() in (QtCore.QEvent.Show, QtCore.QEvent.WindowStateChange) and not obj.isMinimized():
+            self.callback()
+        return False
+
+
+# file dialog filters with their loading functions, and the filter of each suffix
+_OPEN_FORMATS = {
+    'PDBQT (*.pdbqt)': io.load_pdbqt,
+    'PDB Dock 4 (*.pdb; *.dock4)': io.load_dock4,
+    'ChimeraX (*.chimerax)': io.load_chimerax,
+    'pyDock (*.ene; *.eneRST)': io.load_pydock,
+    'XYZ (*.xyz)': io.load_xyz,
+    'All Files(*)': None}
+_OPEN_BY_SUFFIX = {
+    'pdbqt': 'PDBQT (*.pdbqt)',
+    'pdb': 'PDB Dock 4 (*.pdb; *.dock4)',
+    'dock4': 'PDB Dock 4 (*.pdb; *.dock4)',
+    'chimerax': 'ChimeraX (*.chimerax)',
+    'ene': 'pyDock (*.ene; *.eneRST)',
+    'enerst': 'pyDock (*.ene; *.eneRST)',
+    'xyz': 'XYZ (*.xyz)'}
+_OPEN_FILTER = ";;".join(_OPEN_FORMATS)
+# file dialog filters with their export formats, and the filter of each suffix
+_EXPORT_FORMATS = {
+    'CSV (*.csv)': 'csv',
+    'Text (*.txt)': 'txt',
+    'All Files(*)': None}
+_EXPORT_BY_SUFFIX = {
+    'csv': 'CSV (*.csv)',
+    'txt': 'Text (*.txt)'}
+_EXPORT_FILTER = ";;".join(_EXPORT_FORMATS)
+
+
+def _suffix(filename) -> str:
+    '''Return the lowercase suffix of a filename without the dot, ignoring a final .gz'''
+    root, extension = os.path.splitext(filename)
+    if extension.lower() == '.gz':
+        extension = os.path.splitext(root)[1]
+    return extension[1:].lower()
+
+
 headers = []
 
 def run_gui() -> None:
@@ -73,161 +203,167 @@ def run_gui() -> None:
     toggle_columns_button.setText("Show/Hide All")
     toggle_objects_button = widget.menuColumns.addAction('buttonToggleObjects')
     toggle_objects_button.setText("Show/Hide Objects")
+    fit_columns_button = widget.menuColumns.addAction('buttonFitColumns')
+    fit_columns_button.setText("Fit Width to All Rows")
     # dockings sub-menus
     include_docking_menu = widget.menuDockings.addMenu('Include')
     exclude_docking_menu = widget.menuDockings.addMenu('Exclude')
 
+    def fill_menu(menu, items):
+        '''Set an action per item in a sub-menu, if they changed, with the item as data'''
+        if [action.data() for action in menu.actions()] == items:
+            return
+        menu.clear()
+        for item in items:
+            menu.addAction(item).setData(item)
+
 
     ##  I/O FILES  ----------------------------------------------------
     def clear_all():
         '''Clear all the docked entries'''
         docked.clear()
-        draw_table()
+        request_redraw()
 
     def browse_open():
         '''Callback for the 'Open' button'''
-        supported_formats = {
-            'PDBQT (*.pdbqt)': io.load_pdbqt,
-            'PDB Dock 4 (*.pdb; *.dock4)': io.load_dock4,
-            'ChimeraX (*.chimerax)': io.load_chimerax,
-            'pyDock (*.ene; *.eneRST)': io.load_pydock,
-            'XYZ (*.xyz)': io.load_xyz,
-            'All Files(*)': None}
-        default_suffix_format = {
-            'pdbqt': 'PDBQT (*.pdbqt)',
-            'pdb': 'PDB Dock 4 (*.pdb)',
-            'chimerax': 'ChimeraX (*.chimerax)',
-            'ene': 'pyDock (*.ene; *.eneRST)',
-            'enerst': 'pyDock (*.ene; *.eneRST)',
-            'xyz': 'XYZ (*.xyz)'}
         # launch open file dialog from system
         filename, format_selected = QtWidgets.QFileDialog.getOpenFileName(parent=dialog,
                                                                           caption='Open file containing docked structures',
                                                                           directory=os.getcwd(),
-                                                                          filter=";;".join(supported_formats.keys()))
+                                                                          filter=_OPEN_FILTER)
         if not filename: return
         # guess format from suffix
         if format_selected == 'All Files(*)':
-            suffix = os.path.basename(filename).rpartition('.')[-1].lower()
-            if suffix in default_suffix_format:
-                format_selected = default_suffix_format[suffix]
+            suffix = _suffix(filename)
+            if suffix in _OPEN_BY_SUFFIX:
+                format_selected = _OPEN_BY_SUFFIX[suffix]
             else:
                 # error message
                 error_msg(f"Unsupported format file:  .{suffix}")
                 return
-        # load file with corresponding formating function and include new object in table
-        old_objects = set(cmd.get_names())
-        supported_formats[format_selected](filename)
-        new_object = (set(cmd.get_names()) - old_objects).pop()
+        # load file with corresponding formating function and include new objects in table
+        old_objects = docked.objects
+        _OPEN_FORMATS[format_selected](filename)
+        new_objects = docked.objects - old_objects
+        update_headers()
         if old_objects and 'object' not in headers:
             headers.insert(0, 'object')
-        include_docking(new_object)
-        # refresh as a new window to avoid empty table bug
-        run_gui()
-        dialog.close()
+        dockings.extend(sorted(new_objects - set(dockings)))
+        request_redraw()
 
     def browse_export_data():
         '''Callback for the 'Export Data' button'''
-        supported_formats = {'CSV (*.csv)': 'csv',
-                             'Text (*.txt)': 'txt',
-                             'All Files(*)': None}
-        default_suffix_format = {'csv': 'CSV (*.csv)',
-                                 'txt': 'Text (*.txt)'}
         # launch open file dialog from system
         filename, format_selected = QtWidgets.QFileDialog.getSaveFileName(parent=dialog,
                                                                           caption='Save file containing docked data',
                                                                           directory=os.getcwd(),
-                                                                          filter=";;".join(supported_formats.keys()))
+                                                                          filter=_EXPORT_FILTER)
         if not filename: return
         # guess format from suffix
         if format_selected == 'All Files(*)':
-            suffix = os.path.basename(filename).rpartition('.')[-1].lower()
-            # if not in supported_formats, fallback to csv
-            format_selected = default_suffix_format.get(suffix, default_suffix_format['csv'])
+            # if not in supported formats, fallback to csv
+            format_selected = _EXPORT_BY_SUFFIX.get(_suffix(filename), _EXPORT_BY_SUFFIX['csv'])
         # save file with corresponding format' arguments
-        io.export_docked_data(filename, supported_formats[format_selected])
+        io.export_docked_data(filename, _EXPORT_FORMATS[format_selected])
 
 
     ##  TABLE  --------------------------------------------------------
-    global headers
+    def available_headers() -> set:
+        '''Return the remarks of the docked entries that can be shown as columns'''
+        return docked.remarks | {'object'}
+
+    def update_headers():
+        '''Keep the current headers if any is available, otherwise take the default ones'''
+        available = available_headers()
+        if not any(i in headers for i in available):
+            headers[:] = [i for i in dict.fromkeys(docked.headers) if i in available]
+
     docked.remove_without_objects()
-    available_headers = set(docked.remarks | {'object'})
-    headers = headers if any(i in headers for i in available_headers) else [i for i in docked.headers if i in available_headers]
+    update_headers()
     dockings = list(set(cmd.get_names('objects', enabled_only=1)) & docked.objects)
 
+    # table model, entries are read from it on demand by the view
+    model = DockedTableModel(dialog)
+    widget.tableDocked.setModel(model)
+    widget.tableDocked.horizontalHeader().setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+    # columns fitted to the visible rows only, and rows of uniform height
+    widget.tableDocked.horizontalHeader().setResizeContentsPrecision(0)
+    widget.tableDocked.verticalHeader().setDefaultSectionSize(widget.tableDocked.fontMetrics().height() + 8)
+
+    # table redraws requested while hidden or minimized, done when shown
+    pending_redraw = False
+
+    def request_redraw():
+        '''Redraw the table if the window is shown, otherwise once it is shown again'''
+        nonlocal pending_redraw
+        if dialog.isVisible() and not dialog.isMinimized():
+            draw_table()
+        else:
+            pending_redraw = True
+
+    def pending_draw_table():
+        '''Redraw the table if any redraw was requested while hidden'''
+        if pending_redraw:
+            draw_table()
+
+    # subset of entries of the last redraw, with the dockings and revision of docked
+    entries_cache = {'key': None, 'entries': []}
+
     def draw_table(headers=headers, dockings=dockings):
         '''Fill the whole table with data from docked entries'''
-        widget.tableDocked.clear()
-        widget.tableDocked.setSortingEnabled(False)
-        n_internal_columns = 3
-        # check unique headers and if in remarks
-        headers = [i for i in dict.fromkeys(headers) if i in available_headers]
-        # subset of entries to include based on dockings
-        entries_ndx = []
-        for object in dockings:
-            entries_ndx.extend(docked.findall(object=object))
-        entries = [docked.entries_unified[i] for i in entries_ndx]
-        # number of rows and columns
-        widget.tableDocked.setColumnCount(len(headers)+n_internal_columns)
-        widget.tableDocked.setRowCount(len(entries))
-        # fill table
-        widget.tableDocked.setHorizontalHeaderLabels([""]*n_internal_columns+headers)
-        for row, entry in enumerate(entries):
-            # hidden internal columns [n_entry, 'object', 'state']
-            widget.tableDocked.setItem(row, 0, QtWidgets.QTableWidgetItem(str(row)))
-            widget.tableDocked.setItem(row, 1, QtWidgets.QTableWidgetItem(str(entry['object'])))
-            widget.tableDocked.setItem(row, 2, QtWidgets.QTableWidgetItem(str(entry['state'])))
-            # assign to table cell
-            for column, remark in enumerate(headers):
-                value = entry[remark]
-                item = QtWidgets.QTableWidgetItem()
-                item.setData(QtCore.Qt.EditRole, value)
-                widget.tableDocked.setItem(row, column+n_internal_columns, item)
-                widget.tableDocked.item(row, column+n_internal_columns).setTextAlignment(QtCore.Qt.AlignCenter)
+        nonlocal pending_redraw
+        pending_redraw = False
+        # check if headers are in remarks (kept unique when modified)
+        available = available_headers()
+        headers = [i for i in headers if i in available]
+        # subset of entries to include based on dockings, reused if not changed
+        entries_key = (tuple(dockings), docked.revision)
+        if entries_cache['key'] != entries_key:
+            entries_ndx = chain.from_iterable(docked.objects_index.get(object, ()) for object in dockings)
+            entries_cache['key'] = entries_key
+            entries_cache['entries'] = [docked.entries_unified[i] for i in entries_ndx]
+        entries = list(entries_cache['entries'])
+        # reset model and keep the sort indicator on the sorted column, repainting only once
+        widget.tableDocked.setUpdatesEnabled(False)
+        model.set_entries(entries, headers)
+        # rows already sorted by the model, so the indicator must not sort them again
+        header = widget.tableDocked.horizontalHeader()
+        header.blockSignals(True)
+        if model.sort_by and model.sort_by[0] in headers:
+            header.setSortIndicator(headers.index(model.sort_by[0]), model.sort_by[1])
+        else:
+            header.setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+        header.blockSignals(False)
         widget.tableDocked.resizeColumnsToContents()
-        widget.tableDocked.resizeRowsToContents()
-        for i in range(n_internal_columns):
-            widget.tableDocked.hideColumn(i)
+        widget.tableDocked.setUpdatesEnabled(True)
         # update columns menubar
-        show_column_menu.clear()
-        hide_column_menu.clear()
-        for i in sorted(docked.remarks - set(headers)):
-            action = show_column_menu.addAction(i)
-            action.triggered.connect(lambda chk, i=i: show_header(i))
-        for i in headers:
-            action = hide_column_menu.addAction(i)
-            action.triggered.connect(lambda chk, i=i: hide_header(i))
+        fill_menu(show_column_menu, sorted(docked.remarks - set(headers)))
+        fill_menu(hide_column_menu, headers)
         # update dockings menubar
-        include_docking_menu.clear()
-        exclude_docking_menu.clear()
-        for i in docked.objects - set(dockings):
-            action = include_docking_menu.addAction(i)
-            action.triggered.connect(lambda chk, i=i: include_docking(i))
-        for i in dockings:
-            action = exclude_docking_menu.addAction(i)
-            action.triggered.connect(lambda chk, i=i: exclude_docking(i))
+        fill_menu(include_docking_menu, sorted(docked.objects - set(dockings)))
+        fill_menu(exclude_docking_menu, list(dockings))
         # show table
-        widget.tableDocked.setSortingEnabled(True)
         widget.tableDocked.show()
 
     def show_header(header):
         '''Add a column to headers'''
-        headers.append(header)
-        draw_table()
+        if header not in headers:
+            headers.append(header)
+        request_redraw()
 
     def hide_header(header):
         '''Remove a column from headers'''
         headers.remove(header)
-        draw_table()
+        request_redraw()
 
     def toggle_all_headers():
         '''Show/hide all column headers'''
-        n_available_headers = len(available_headers) if 'object' in headers else len(available_headers) - 1
+        n_available_headers = len(available_headers()) if 'object' in headers else len(available_headers()) - 1
         if len(headers) < n_available_headers:
-            headers.extend(docked.remarks)
+            headers.extend(i for i in docked.remarks if i not in headers)
         else:
             headers.clear()
-        draw_table()
+        request_redraw()
 
     def toggle_objects():
         '''Show/hide objects column'''
@@ -235,25 +371,30 @@ def run_gui() -> None:
             headers.remove('object')
         else:
             headers.insert(0, 'object')
-        draw_table()
+        request_redraw()
+
+    def fit_columns():
+        '''Fit the width of columns to the contents of all rows'''
+        widget.tableDocked.horizontalHeader().setResizeContentsPrecision(-1)
+        widget.tableDocked.resizeColumnsToContents()
+        widget.tableDocked.horizontalHeader().setResizeContentsPrecision(0)
 
     def include_docking(docking):
         '''Include docking object to table'''
         dockings.append(docking)
-        draw_table()
+        request_redraw()
 
     def exclude_docking(docking):
         '''Exclude docking object from table'''
         dockings.remove(docking)
-        draw_table()
+        request_redraw()
 
     def selected() -> list:
         '''Return selected index, object and state'''
-        selected_row = widget.tableDocked.selectedItems()
+        selected_row = widget.tableDocked.selectionModel().selectedRows()
         if selected_row:
-            row_n = selected_row[0].row()
-            object = widget.tableDocked.item(row_n, 1).text()
-            state = int(widget.tableDocked.item(row_n, 2).text())
+            entry = model.entry(selected_row[0].row())
+            object, state = entry['object'], entry['state']
             ndx = docked.find(object=object, state=state)
             return [ndx, object, state]
         else:
@@ -307,7 +448,7 @@ def run_gui() -> None:
     def refresh():
         '''Refresh the entries and table'''
         docked.remove_without_objects()
-        draw_table()
+        request_redraw()
 
 
     ##  CALLBACKS  ----------------------------------------------------
@@ -316,16 +457,23 @@ def run_gui() -> None:
     widget.buttonClearAll.triggered.connect(clear_all)
     toggle_columns_button.triggered.connect(toggle_all_headers)
     toggle_objects_button.triggered.connect(toggle_objects)
+    fit_columns_button.triggered.connect(fit_columns)
+    show_column_menu.triggered.connect(lambda action: show_header(action.data()))
+    hide_column_menu.triggered.connect(lambda action: hide_header(action.data()))
+    include_docking_menu.triggered.connect(lambda action: include_docking(action.data()))
+    exclude_docking_menu.triggered.connect(lambda action: exclude_docking(action.data()))
     widget.buttonOnlineDocs.triggered.connect(online_docs)
     widget.buttonAbout.triggered.connect(about)
-    widget.tableDocked.itemSelectionChanged.connect(display_selected)
+    widget.tableDocked.selectionModel().selectionChanged.connect(display_selected)
+    widget.tableDocked.setSortingEnabled(True)
     widget.tableDocked.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
     widget.tableDocked.customContextMenuRequested.connect(right_click)
 
 
     ##  MAIN  ---------------------------------------------------------
-    if len(dockings) > 1:
+    if len(dockings) > 1 and 'object' not in headers:
         headers.insert(0, 'object')
-    draw_table()
+    dialog.installEventFilter(_ShowEventFilter(pending_draw_table, dialog))
+    request_redraw()
 
     dialog.show()
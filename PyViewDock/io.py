@@ -13,10 +13,12 @@
 
 """
 
+import hashlib
 import os
 import re
+import time
 import xml.etree.ElementTree as ET
-from glob import glob
+from concurrent.futures import ThreadPoolExecutor
 from textwrap import dedent
 from urllib.error import HTTPError
 from urllib.request import urlopen
@@ -27,6 +29,51 @@ from . import misc
 from .docked import Docked, get_docked
 
 
+# URL of the cluster of ligands in the commands of a ChimeraX file
+_CLUSTER_URL_RE = re.compile(r'"(http[^"]+pdb)"')
+# downloaded files, kept to avoid fetching them again
+_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'pyviewdock')
+# seconds a downloaded file is reused before fetching it again
+_CACHE_MAX_AGE = 7 * 24 * 3600
+# last directory listing for autocompletion, as ((directory, suffixes), time, filenames)
+_last_listing = (None, 0.0, [])
+
+
+def _files_with_suffix(*suffixes, ttl=2.0) -> list:
+    '''Return the files of the current directory ending with any suffix, reusing the last listing if recent'''
+    global _last_listing
+    key = (os.getcwd(), suffixes)
+    now = time.monotonic()
+    if key == _last_listing[0] and now - _last_listing[1] < ttl:
+        return _last_listing[2]
+    with os.scandir() as entries:
+        filenames = [entry.name for entry in entries
+                     if entry.name.endswith(suffixes) and not entry.name.startswith('.')]
+    _last_listing = (key, now, filenames)
+    return filenames
+
+
+def _fetch(url) -> str:
+    '''Return the text of a remote file, from the local cache if it was downloaded recently'''
+    cache_file = os.path.join(_CACHE_DIR, hashlib.sha1(url.encode()).hexdigest() + '_' + url.split('/')[-1])
+    try:
+        if time.time() - os.path.getmtime(cache_file) < _CACHE_MAX_AGE:
+            with open(cache_file, encoding='utf-8') as f:
+                return f.read()
+    except OSError:
+        pass
+    text = urlopen(url).read().decode('utf-8')
+    # write through, never leaving a partial file in the cache
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        with open(cache_file + '.part', 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(cache_file + '.part', cache_file)
+    except OSError:
+        pass
+    return text
+
+
 def load_pdbqt(filename, object='') -> None:
     '''
     DESCRIPTION
@@ -58,13 +105,13 @@ def load_pdbqt(filename, object='') -> None:
     docked = get_docked()
 
     if not object:
-        object = os.path.basename(filename).split('.')[0]
+        object = os.path.basename(filename).partition('.')[0]
     object = misc.non_repeated_object(object)
 
     docked.load_pdbqt(filename, object)
     print(f" PyViewDock: \"{filename}\" loaded as \"{object}\"")
 
-cmd.auto_arg[0]['load_pdbqt'] = [lambda: cmd.Shortcut(glob('*.pdbqt')), 'filename', ', ']
+cmd.auto_arg[0]['load_pdbqt'] = [lambda: cmd.Shortcut(_files_with_suffix('.pdbqt', '.pdbqt.gz')), 'filename', ', ']
 cmd.auto_arg[1]['load_pdbqt'] = [cmd.object_sc, 'object', '']
 
 def load_dock4(filename, object='', mode=0) -> None:
@@ -103,21 +150,20 @@ def load_dock4(filename, object='', mode=0) -> None:
 
     docked = get_docked()
 
-    # check file and read as list of strings
+    # check file
     if not os.path.isfile(filename):
         raise CmdException(f"File \"{filename}\" not found.", "PyViewDock")
-    else:
-        with open(filename, "rt") as f:
-            cluster = f.readlines()
 
     if not object:
-        object = os.path.basename(filename).split('.')[0]
+        object = os.path.basename(filename).partition('.')[0]
     object = misc.non_repeated_object(object)
 
-    docked.load_dock4(cluster, object, mode)
+    # read while loading, line by line
+    with misc.open_file(filename) as f:
+        docked.load_dock4(f, object, mode)
     print(f" PyViewDock: \"{filename}\" loaded as \"{object}\"")
 
-cmd.auto_arg[0]['load_dock4'] = [lambda: cmd.Shortcut(glob('*.pdb') + glob('*.dock4')), 'filename', ', ']
+cmd.auto_arg[0]['load_dock4'] = [lambda: cmd.Shortcut(_files_with_suffix('.pdb', '.dock4', '.pdb.gz', '.dock4.gz')), 'filename', ', ']
 cmd.auto_arg[1]['load_dock4'] = [cmd.object_sc, 'object', ', ']
 
 def load_chimerax(filename) -> None:
@@ -126,6 +172,9 @@ def load_chimerax(filename) -> None:
 
         "load_chimerax" loads a UCSF ChimeraX file written by SwissDock
 
+        Downloaded structures are kept in ~/.cache/pyviewdock and reused
+        for a week, delete that directory to fetch them again
+
     USAGE
 
         load_chimerax  filename
@@ -154,25 +203,40 @@ def load_chimerax(filename) -> None:
 
     print(f" PyViewDock: Loading \"{filename}\"")
 
-    # read ChimeraX file as XML
+    # read ChimeraX file as XML, only until the target and the commands are found
     try:
-        chimerax_xml = ET.parse(filename).getroot()
-        target_url = chimerax_xml.find('web_files').find('file').get('loc')
-        commands = chimerax_xml.find('commands').find('py_cmd').text
-        cluster_url = re.findall('"(http[^"]+pdb)"', commands)[0]
+        target_url = commands = None
+        # tags from the root to the current element, to match only 'web_files/file' and 'commands/py_cmd'
+        path = []
+        for event, element in ET.iterparse(filename, events=('start', 'end')):
+            if event == 'start':
+                path.append(element.tag)
+                continue
+            if path[1:] == ['web_files', 'file'] and target_url is None:
+                target_url = element.get('loc')
+            elif path[1:] == ['commands', 'py_cmd'] and commands is None:
+                commands = element.text
+            path.pop()
+            element.clear()
+            if target_url is not None and commands is not None:
+                break
+        cluster_match = _CLUSTER_URL_RE.search(commands)
+        cluster_url = cluster_match.group(1) if cluster_match else ''
+        if not (target_url and cluster_url): raise ValueError
         target_filename = target_url.split('/')[-1]
         cluster_filename = cluster_url.split('/')[-1]
-        if not all([target_url, cluster_url, target_filename, cluster_filename]): raise ValueError
     except FileNotFoundError:
         raise CmdException(f"Failed reading 'chimerax' file. File not found.", "PyViewDock")
-    except:
+    except (ET.ParseError, OSError, AttributeError, TypeError, ValueError):
         raise CmdException(f"Failed reading 'chimerax' file. Invalid format.", "PyViewDock")
     else:
-        # fetch files from server
+        # fetch files from server (or cache), both at the same time
         try:
-            target_pdb = urlopen(target_url).read().decode('utf-8')
-            cluster_pdb = urlopen(cluster_url).readlines()
-            cluster_pdb = [i.decode('utf-8') for i in cluster_pdb]
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                target_future = executor.submit(_fetch, target_url)
+                cluster_future = executor.submit(_fetch, cluster_url)
+                target_pdb = target_future.result()
+                cluster_pdb = cluster_future.result().splitlines()
             cmd.read_pdbstr(target_pdb, target_object)
             docked.load_dock4(cluster_pdb, clusters_object, 0)
         except HTTPError:
@@ -181,12 +245,12 @@ def load_chimerax(filename) -> None:
             chimerax_directory = os.path.dirname(os.path.realpath(filename))
             target_file = os.path.join(chimerax_directory, target_filename)
             cluster_file = os.path.join(chimerax_directory, cluster_filename)
-            if os.path.isfile(target_file) and os.path.isfile(target_file):
+            if os.path.isfile(target_file) and os.path.isfile(cluster_file):
                 print(f" PyViewDock: Files found locally ({target_filename}, {cluster_filename}). Loading...")
                 importing.load(target_file, target_object)
                 load_dock4(cluster_file, clusters_object, 0)
 
-cmd.auto_arg[0]['load_chimerax'] = [lambda: cmd.Shortcut(glob('*.chimerax')), 'filename', '']
+cmd.auto_arg[0]['load_chimerax'] = [lambda: cmd.Shortcut(_files_with_suffix('.chimerax')), 'filename', '']
 
 def load_pydock(filename, object='', max_n=100) -> None:
     '''
@@ -222,12 +286,12 @@ def load_pydock(filename, object='', max_n=100) -> None:
     docked = get_docked()
 
     if not object:
-        object = os.path.basename(filename).split('.')[0]
+        object = os.path.basename(filename).partition('.')[0]
 
     docked.load_pydock(filename, object, max_n)
     print(f" PyViewDock: \"{filename}\" loaded as \"{object}\"")
 
-cmd.auto_arg[0]['load_pydock'] = [lambda: cmd.Shortcut(glob('*.ene') + glob('*.eneRST')), 'filename', ', ']
+cmd.auto_arg[0]['load_pydock'] = [lambda: cmd.Shortcut(_files_with_suffix('.ene', '.eneRST', '.ene.gz', '.eneRST.gz')), 'filename', ', ']
 cmd.auto_arg[1]['load_pydock'] = [cmd.object_sc, 'object', ', ']
 
 def load_xyz(filename, object='') -> None:
@@ -261,13 +325,13 @@ def load_xyz(filename, object='') -> None:
     docked = get_docked()
 
     if not object:
-        object = os.path.basename(filename).split('.')[0]
+        object = os.path.basename(filename).partition('.')[0]
     object = misc.non_repeated_object(object)
 
     docked.load_xyz(filename, object)
     print(f" PyViewDock: \"{filename}\" loaded as \"{object}\"")
 
-cmd.auto_arg[0]['load_xyz'] = [lambda: cmd.Shortcut(glob('*.xyz')), 'filename', ', ']
+cmd.auto_arg[0]['load_xyz'] = [lambda: cmd.Shortcut(_files_with_suffix('.xyz', '.xyz.gz')), 'filename', ', ']
 cmd.auto_arg[1]['load_xyz'] = [cmd.object_sc, 'object', '']
 
 def export_docked_data(filename, format='') -> None:
@@ -298,12 +362,12 @@ def export_docked_data(filename, format='') -> None:
     docked = get_docked()
 
     if not format:
-        suffix = os.path.basename(filename).rpartition('.')[-1].lower()
+        suffix = os.path.splitext(filename)[1][1:].lower()
         format = suffix if suffix in {'csv', 'txt'} else 'csv'
 
     docked.export_data(filename, format)
 
-cmd.auto_arg[0]['export_docked_data'] = [lambda: cmd.Shortcut(glob('*.csv') + glob('*.txt')), 'filename', ', ']
+cmd.auto_arg[0]['export_docked_data'] = [lambda: cmd.Shortcut(_files_with_suffix('.csv', '.txt')), 'filename', ', ']
 cmd.auto_arg[1]['export_docked_data'] = [lambda: cmd.Shortcut(['csv', 'txt']), 'format', '']
 
 def load_ext(filename, object='', state=0, format='', finish=1,
@@ -325,25 +389,31 @@ def load_ext(filename, object='', state=0, format='', finish=1,
             energy table with reference numbers of structures from pyDock
     '''
 
+    docked_format = format
     if not format:
-        file_dot_separated = os.path.basename(filename).rpartition('.')
-        object = object or "".join(file_dot_separated[:-2])
-        format = file_dot_separated[-1]
+        root, extension = os.path.splitext(os.path.basename(filename))
+        format = extension[1:]
+        # docking format from the suffix before, if gzipped
+        if extension.lower() == '.gz':
+            root, extension = os.path.splitext(root)
+        object = object or root
+        docked_format = extension[1:]
+    docked_format = docked_format.lower()
 
     # Chimera X
-    if format.lower() == "chimerax":
+    if docked_format == "chimerax":
         load_chimerax(filename)
 
     # Dock 4
-    elif format.lower() == "dock4":
+    elif docked_format == "dock4":
         load_dock4(filename, object)
 
     # pyDock
-    elif format.lower() in ("ene", "enerst"):
+    elif docked_format in ("ene", "enerst"):
         load_pydock(filename, object)
 
     # PDBQT
-    elif format.lower() == "pdbqt":
+    elif docked_format == "pdbqt":
         load_pdbqt(filename, object)
 
     # original load function
@@ -5,11 +5,14 @@
   Functions
   ---------
     non_repeated_object
+    open_file
     set_name_catcher
     align_multi
 
 """
 
+import gzip
+
 from pymol import cmd, CmdException
 
 from .docked import get_docked
@@ -36,7 +39,7 @@ def non_repeated_object(object:str, quiet=0) -> str:
 
         object_name  ->  object_name  /  object_name_1, object_name_2, ...
     '''
-    current_objects = cmd.get_names('objects')
+    current_objects = set(cmd.get_names('objects'))
     if object in current_objects:
         n = 2
         while f"{object}_{n}" in current_objects:
@@ -47,6 +50,27 @@ def non_repeated_object(object:str, quiet=0) -> str:
     else:
         return object
 
+def open_file(filename:str, mode='rt'):
+    '''
+    DESCRIPTION
+
+        Open a file for reading, decompressing it on the fly if gzipped
+
+    ARGUMENTS
+
+        filename = string: path to the file, gzipped or not
+
+        mode = 'rt'/'rb': text or binary reading {default: 'rt'}
+
+    RETURNS
+
+        file object
+    '''
+    # detect gzip by its magic number, whatever the suffix
+    with open(filename, 'rb') as f:
+        gzipped = f.read(2) == b'\x1f\x8b'
+    return gzip.open(filename, mode) if gzipped else open(filename, mode)
+
 def set_name_catcher(old_name, new_name, _self=cmd):
     '''
     DESCRIPTION